@@ -3,10 +3,9 @@ Configuration management for the AI Financial Chatbot.
 Loads environment variables and provides settings for the application.
 """
 
-import os
+from functools import lru_cache
 from typing import List, Optional
-from pydantic import BaseModel, Field
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     """Application settings."""
@@ -18,20 +17,22 @@ class Settings(BaseSettings):
     CORS_ORIGINS: List[str] = ["http://localhost:3000"]
 
     # Security settings
-    SECRET_KEY: str = Field(default=os.getenv("SECRET_KEY", "supersecretkey"))
+    SECRET_KEY: str = "supersecretkey"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
     # NLP model settings
-    NLP_MODEL_PATH: str = Field(default=os.getenv("NLP_MODEL_PATH", "models/intent_classifier"))
+    NLP_MODEL_PATH: str = "models/intent_classifier"
 
     # External API settings
-    FINANCIAL_API_KEY: str = Field(default=os.getenv("FINANCIAL_API_KEY", ""))
-    FINANCIAL_API_URL: str = Field(default=os.getenv("FINANCIAL_API_URL", "https://api.example.com"))
+    FINANCIAL_API_KEY: str = ""
+    FINANCIAL_API_URL: str = "https://api.example.com"
 
     # Database settings
-    SUPABASE_URL: str = Field(default=os.getenv("SUPABASE_URL", ""))
-    SUPABASE_KEY: str = Field(default=os.getenv("SUPABASE_KEY", ""))
+    SUPABASE_URL: str = ""
+    SUPABASE_KEY: str = ""
+    # Postgres connection string, used by scripts/setup_database.py
+    SUPABASE_DB_URL: str = ""
 
     # Database table names
     DB_USERS_TABLE: str = "users"
@@ -40,11 +41,21 @@ class Settings(BaseSettings):
     # Database credentials (optional)
     DB_PASSWORD: Optional[str] = None
 
-    model_config = {
-        "env_file": ".env",
-        "case_sensitive": True,
-        "extra": "ignore"  # Ignore extra fields not defined in the model
-    }
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_encoding="utf-8",
+        case_sensitive=True,
+        extra="ignore",  # Ignore extra fields not defined in the model
+    )
 
-# Initialize settings
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Return the application settings, constructing them on first use.
+
+    Use get_settings.cache_clear() to reload settings (e.g. in tests).
+
+    Returns:
+        Settings: The cached application settings
+    """
+    return Settings()
@@ -2,6 +2,6 @@
 Database package for the AI Financial Chatbot.
 """
 
-from app.db.database import supabase_client
+from app.db.database import get_supabase_client
 
-__all__ = ["supabase_client"]
+__all__ = ["get_supabase_client"]
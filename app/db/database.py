@@ -3,45 +3,91 @@ Database connection module for the AI Financial Chatbot.
 Initializes and provides the Supabase client.
 """
 
-import os
 import logging
-from typing import Optional, Dict, Any, List
-from supabase import create_client, Client
-from app.config import settings
+from bisect import bisect_right
+from datetime import datetime, timezone
+from functools import lru_cache
+from operator import itemgetter
+from typing import Dict, Any, List
+import httpx
+from supabase import create_client, Client, ClientOptions
+from app.config import get_settings
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Precomputed bcrypt hash of "password123" for the test user, so neither the
+# mock client nor scripts/setup_database.py pays for (or imports) bcrypt
+TEST_USER_HASHED_PASSWORD = "$2b$12$kL.bJgt/rMroNocimA9qv.23YgPXhwQxiRgT7goI5IqYV8rqdns36"
+
+# Request timeout postgrest uses when it creates its own HTTP client
+POSTGREST_TIMEOUT_SECONDS = 120.0
+
 # Mock database for fallback when Supabase is not configured
 class MockSupabaseClient:
     """Mock Supabase client for development and testing."""
 
-    def __init__(self):
-        """Initialize the mock database."""
-        from datetime import datetime, timezone
-        from passlib.context import CryptContext
+    # Columns with hash indexes for equality filters, mapped to the column
+    # each index bucket is kept sorted by (None keeps insertion order)
+    INDEXED_COLUMNS = {
+        "users": {"id": None, "username": None},
+        "chat_history": {"user_id": "timestamp"},
+    }
 
-        # Password hashing
-        pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    # Timestamp columns filled on insert, mirroring their DEFAULT NOW()
+    TIMESTAMP_COLUMNS = {
+        "users": "created_at",
+        "chat_history": "timestamp",
+    }
 
+    def __init__(self):
+        """Initialize the mock database."""
         # Create a test user
         test_user = {
             "id": "00000000-0000-0000-0000-000000000001",
             "username": "testuser",
             "email": "test@example.com",
             "full_name": "Test User",
-            "hashed_password": pwd_context.hash("password123"),
+            "hashed_password": TEST_USER_HASHED_PASSWORD,
             "is_active": True,
-            "is_premium": False,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "is_premium": False
         }
 
         self.tables = {
-            "users": [test_user],
+            "users": [],
             "chat_history": []
         }
+        self.indexes = {
+            table_name: {column: {} for column in columns}
+            for table_name, columns in self.INDEXED_COLUMNS.items()
+        }
+        self.add_rows("users", [test_user])
         logger.warning("Using MockSupabaseClient as Supabase is not configured")
 
+    def add_rows(self, table_name: str, rows: List[Dict[str, Any]]) -> None:
+        """Append rows to a table and update its indexes."""
+        timestamp_column = self.TIMESTAMP_COLUMNS.get(table_name)
+        if timestamp_column:
+            now = datetime.now(timezone.utc).isoformat()
+            for row in rows:
+                row.setdefault(timestamp_column, now)
+
+        self.tables[table_name].extend(rows)
+
+        sort_columns = self.INDEXED_COLUMNS.get(table_name, {})
+        for column, index in self.indexes.get(table_name, {}).items():
+            sort_column = sort_columns[column]
+            for row in rows:
+                keys, bucket = index.setdefault(row.get(column), ([], []))
+                if sort_column is None:
+                    bucket.append(row)
+                else:
+                    # Keep the bucket ordered so ordered reads need no sort
+                    key = row.get(sort_column, "")
+                    position = bisect_right(keys, key)
+                    keys.insert(position, key)
+                    bucket.insert(position, row)
+
     def table(self, table_name: str):
         """Get a table reference."""
         return MockTable(self, table_name)
@@ -62,6 +108,8 @@ class MockSupabaseClient:
 class MockTable:
     """Mock table for the mock Supabase client."""
 
+    __slots__ = ("client", "table_name", "filters", "order_by", "limit_val", "selected_columns")
+
     def __init__(self, client, table_name: str):
         """Initialize the mock table."""
         self.client = client
@@ -91,12 +139,12 @@ class MockTable:
         self.limit_val = limit_val
         return self
 
-    def insert(self, data: Dict[str, Any]):
-        """Insert data into the table."""
+    def insert(self, data: Dict[str, Any], returning: str = "representation", default_to_null: bool = True):
+        """Insert data into the table; missing columns always take their defaults."""
         if isinstance(data, dict):
-            self.client.tables[self.table_name].append(data)
+            self.client.add_rows(self.table_name, [data])
         elif isinstance(data, list):
-            self.client.tables[self.table_name].extend(data)
+            self.client.add_rows(self.table_name, data)
         return self
 
     def update(self, data: Dict[str, Any]):
@@ -105,22 +153,39 @@ class MockTable:
 
     def execute(self):
         """Execute the query."""
-        # Apply filters
         results = self.client.tables[self.table_name]
-        for column, op, value in self.filters:
+        filters = self.filters
+        sorted_by = None
+
+        # Look up the first indexed equality filter in its hash index
+        indexes = self.client.indexes.get(self.table_name, {})
+        for i, (column, op, value) in enumerate(filters):
+            if op == "=" and column in indexes:
+                _, results = indexes[column].get(value, ([], []))
+                sorted_by = self.client.INDEXED_COLUMNS[self.table_name][column]
+                filters = filters[:i] + filters[i + 1:]
+                break
+
+        # Apply remaining filters
+        for column, op, value in filters:
             if op == "=":
                 results = [r for r in results if r.get(column) == value]
 
-        # Apply ordering
+        # Apply ordering, reusing the index order when it matches
         if self.order_by:
             column, desc = self.order_by
-            results = sorted(results, key=lambda x: x.get(column, ""), reverse=desc)
+            if column != sorted_by:
+                results = sorted(results, key=itemgetter(column), reverse=desc)
+            elif desc:
+                start = max(len(results) - self.limit_val, 0) if self.limit_val else 0
+                results = results[start:][::-1]
 
         # Apply limit
         if self.limit_val:
             results = results[:self.limit_val]
 
-        return MockResponse(results)
+        # Never hand out the live table or index bucket
+        return MockResponse(list(results))
 
 class MockResponse:
     """Mock response from the mock Supabase client."""
@@ -129,14 +194,18 @@ class MockResponse:
         """Initialize the mock response."""
         self.data = data
 
+@lru_cache(maxsize=1)
 def get_supabase_client() -> Client:
     """
-    Initialize and return a Supabase client.
+    Initialize and return the shared Supabase client.
+
+    The client is created on first use and reused afterwards.
 
     Returns:
         Client: Initialized Supabase client or MockSupabaseClient
     """
     try:
+        settings = get_settings()
         url = settings.SUPABASE_URL
         key = settings.SUPABASE_KEY
 
@@ -144,14 +213,19 @@ def get_supabase_client() -> Client:
             logger.warning("Supabase URL or key not provided, using mock client")
             return MockSupabaseClient()
 
-        client = create_client(url, key)
+        # Share one keep-alive HTTP/2 connection pool across all requests;
+        # keep postgrest's timeout rather than httpx's 5 s default
+        http_client = httpx.Client(
+            http2=True,
+            follow_redirects=True,
+            timeout=httpx.Timeout(POSTGREST_TIMEOUT_SECONDS),
+            limits=httpx.Limits(max_keepalive_connections=32),
+        )
+        client = create_client(url, key, options=ClientOptions(httpx_client=http_client))
         logger.info("Supabase client initialized successfully")
         return client
 
     except Exception as e:
-        logger.error(f"Error initializing Supabase client: {str(e)}")
+        logger.error("Error initializing Supabase client", exc_info=e)
         logger.warning("Falling back to mock client")
         return MockSupabaseClient()
-
-# Initialize the Supabase client
-supabase_client = get_supabase_client()
@@ -3,10 +3,12 @@ Database models and operations for the AI Financial Chatbot.
 Provides functions to interact with the Supabase database.
 """
 
+import asyncio
 import logging
 from typing import Dict, List, Optional, Any
-from datetime import datetime, timezone
-from app.db.database import supabase_client
+from cachetools import TTLCache
+from postgrest.types import ReturnMethod
+from app.db.database import get_supabase_client
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -15,6 +17,15 @@ logger = logging.getLogger(__name__)
 USERS_TABLE = "users"
 CHAT_HISTORY_TABLE = "chat_history"
 
+# Users looked up by username, kept briefly to spare a round trip per request
+USER_CACHE_SIZE = 1024
+USER_CACHE_TTL_SECONDS = 30
+_user_cache: TTLCache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+# One lock per username being looked up, so concurrent misses share a query
+# without holding up lookups of other users
+_user_locks: Dict[str, asyncio.Lock] = {}
+
 class UserRepository:
     """Repository for user operations."""
     
@@ -29,12 +40,9 @@ class UserRepository:
         Returns:
             Dict: Created user data
         """
-        try:
-            response = supabase_client.table(USERS_TABLE).insert(user_data).execute()
-            return response.data[0] if response.data else {}
-        except Exception as e:
-            logger.error(f"Error creating user: {str(e)}")
-            raise
+        response = get_supabase_client().table(USERS_TABLE).insert(user_data).execute()
+        UserRepository.invalidate(user_data["username"])
+        return response.data[0] if response.data else {}
     
     @staticmethod
     async def get_user_by_username(username: str) -> Optional[Dict[str, Any]]:
@@ -45,14 +53,26 @@ class UserRepository:
             username: Username to search for
             
         Returns:
-            Optional[Dict]: User data if found, None otherwise
+            Optional[Dict]: User data if found, None otherwise (a copy, so
+            callers cannot change the cached row)
         """
-        try:
-            response = supabase_client.table(USERS_TABLE).select("*").eq("username", username).execute()
-            return response.data[0] if response.data else None
-        except Exception as e:
-            logger.error(f"Error getting user by username: {str(e)}")
-            raise
+        user = _user_cache.get(username)
+        if user is None:
+            lock = _user_locks.setdefault(username, asyncio.Lock())
+            try:
+                async with lock:
+                    # Another request may have filled the cache while we waited
+                    user = _user_cache.get(username)
+                    if user is None:
+                        query = get_supabase_client().table(USERS_TABLE).select("*").eq("username", username)
+                        response = await asyncio.to_thread(query.execute)
+                        user = response.data[0] if response.data else None
+                        if user is not None:
+                            _user_cache[username] = user
+            finally:
+                if not lock.locked() and _user_locks.get(username) is lock:
+                    del _user_locks[username]
+        return dict(user) if user is not None else None
     
     @staticmethod
     async def get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
@@ -65,12 +85,8 @@ class UserRepository:
         Returns:
             Optional[Dict]: User data if found, None otherwise
         """
-        try:
-            response = supabase_client.table(USERS_TABLE).select("*").eq("id", user_id).execute()
-            return response.data[0] if response.data else None
-        except Exception as e:
-            logger.error(f"Error getting user by ID: {str(e)}")
-            raise
+        response = get_supabase_client().table(USERS_TABLE).select("*").eq("id", user_id).execute()
+        return response.data[0] if response.data else None
     
     @staticmethod
     async def update_user(user_id: str, user_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -84,12 +100,24 @@ class UserRepository:
         Returns:
             Dict: Updated user data
         """
-        try:
-            response = supabase_client.table(USERS_TABLE).update(user_data).eq("id", user_id).execute()
-            return response.data[0] if response.data else {}
-        except Exception as e:
-            logger.error(f"Error updating user: {str(e)}")
-            raise
+        response = get_supabase_client().table(USERS_TABLE).update(user_data).eq("id", user_id).execute()
+
+        # Drop cached lookups for this user, whatever username they are under
+        for username, user in list(_user_cache.items()):
+            if user.get("id") == user_id:
+                UserRepository.invalidate(username)
+
+        return response.data[0] if response.data else {}
+    
+    @staticmethod
+    def invalidate(username: str) -> None:
+        """
+        Drop the cached lookup for a username.
+        
+        Args:
+            username: Username whose cached user data to discard
+        """
+        _user_cache.pop(username, None)
 
 class ChatHistoryRepository:
     """Repository for chat history operations."""
@@ -105,16 +133,32 @@ class ChatHistoryRepository:
         Returns:
             Dict: Created message data
         """
-        try:
-            # Ensure timestamp is set
-            if "timestamp" not in message_data:
-                message_data["timestamp"] = datetime.now(timezone.utc).isoformat()
-                
-            response = supabase_client.table(CHAT_HISTORY_TABLE).insert(message_data).execute()
-            return response.data[0] if response.data else {}
-        except Exception as e:
-            logger.error(f"Error adding message to chat history: {str(e)}")
-            raise
+        # The timestamp column defaults to NOW() when not provided; the
+        # blocking request runs in a worker thread to keep the event loop free
+        query = get_supabase_client().table(CHAT_HISTORY_TABLE).insert(message_data)
+        response = await asyncio.to_thread(query.execute)
+        return response.data[0] if response.data else {}
+    
+    @staticmethod
+    async def add_messages(messages: List[Dict[str, Any]], return_rows: bool = True) -> List[Dict[str, Any]]:
+        """
+        Add several messages to the chat history in a single insert.
+        
+        Args:
+            messages: Message data to insert
+            return_rows: Whether the database should send the created rows back
+            
+        Returns:
+            List[Dict]: Created message data (empty if return_rows is False)
+        """
+        returning = ReturnMethod.representation if return_rows else ReturnMethod.minimal
+        # Missing columns (e.g. timestamp) take their database defaults rather
+        # than NULL, which PostgREST would otherwise send for bulk inserts
+        query = get_supabase_client().table(CHAT_HISTORY_TABLE) \
+            .insert(messages, returning=returning, default_to_null=False)
+        # Run the blocking request in a worker thread so callers can overlap it
+        response = await asyncio.to_thread(query.execute)
+        return response.data or []
     
     @staticmethod
     async def get_user_chat_history(user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
@@ -128,16 +172,12 @@ class ChatHistoryRepository:
         Returns:
             List[Dict]: Chat history messages
         """
-        try:
-            response = supabase_client.table(CHAT_HISTORY_TABLE) \
-                .select("*") \
-                .eq("user_id", user_id) \
-                .order("timestamp", desc=True) \
-                .limit(limit) \
-                .execute()
-            
-            # Return messages in chronological order
-            return list(reversed(response.data)) if response.data else []
-        except Exception as e:
-            logger.error(f"Error getting chat history: {str(e)}")
-            raise
+        response = get_supabase_client().table(CHAT_HISTORY_TABLE) \
+            .select("*") \
+            .eq("user_id", user_id) \
+            .order("timestamp", desc=True) \
+            .limit(limit) \
+            .execute()
+        
+        # Return messages in chronological order
+        return response.data[::-1] if response.data else []
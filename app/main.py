@@ -3,15 +3,23 @@ Main application entry point for the AI Financial Chatbot.
 Sets up FastAPI and includes all routes.
 """
 
+import json
 import logging
-from fastapi import FastAPI, Depends, HTTPException
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 
-from app.config import settings
+from postgrest.exceptions import APIError
+
+from app.config import get_settings
+from app.db.database import get_supabase_client
 from app.routes import chat
-from app.models.user import Token, authenticate_user, create_access_token, create_user, UserCreate
-from datetime import timedelta
+from app.routes.chat import get_intent_classifier
+from app.models.user import Token, authenticate_user, create_access_token, create_user, now_utc, UserCreate
+from datetime import datetime, timedelta
 
 # Configure logging
 logging.basicConfig(
@@ -20,11 +28,22 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+settings = get_settings()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared clients and models on startup instead of at import time."""
+    get_supabase_client()
+    get_intent_classifier()
+    _health_body()
+    yield
+
 # Initialize FastAPI app
 app = FastAPI(
     title="AI Financial Chatbot",
     description="An intelligent chatbot for financial queries and assistance",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -39,6 +58,17 @@ app.add_middleware(
 # Include routers
 app.include_router(chat.router)
 
+# Postgres error code for unique constraint violations
+UNIQUE_VIOLATION = "23505"
+
+@app.exception_handler(APIError)
+async def database_exception_handler(request: Request, exc: APIError):
+    """Turn duplicate-key database errors into 400s and others into 500s."""
+    if exc.code == UNIQUE_VIOLATION:
+        return JSONResponse(status_code=400, content={"detail": "Resource already exists"})
+    logger.error("Database error on %s %s", request.method, request.url.path, exc_info=exc)
+    return JSONResponse(status_code=500, content={"detail": "Database error"})
+
 @app.get("/")
 async def root():
     """Root endpoint that returns API information."""
@@ -48,28 +78,34 @@ async def root():
         "version": "0.1.0",
     }
 
+@lru_cache(maxsize=1)
+def _health_body() -> bytes:
+    """Render the health check payload once, as it only depends on settings."""
+    if not settings.SUPABASE_URL or not settings.SUPABASE_KEY:
+        payload = {
+            "status": "warning",
+            "message": "Supabase not configured. Using in-memory storage.",
+            "supabase_url": "not configured"
+        }
+    else:
+        payload = {
+            "status": "healthy",
+            "database": "connected",
+            "supabase_url": settings.SUPABASE_URL[:20] + "..."
+        }
+    return json.dumps(payload).encode("utf-8")
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
     try:
-        # Check if Supabase is configured
-        if not settings.SUPABASE_URL or not settings.SUPABASE_KEY:
-            return {
-                "status": "warning",
-                "message": "Supabase not configured. Using in-memory storage.",
-                "supabase_url": "not configured"
-            }
-
-        # Try to import the client (will fail if connection fails)
-        from app.db.database import supabase_client
+        # Get the client if Supabase is configured (will fail if connection fails)
+        if settings.SUPABASE_URL and settings.SUPABASE_KEY:
+            get_supabase_client()
 
-        return {
-            "status": "healthy",
-            "database": "connected",
-            "supabase_url": settings.SUPABASE_URL[:20] + "..." if settings.SUPABASE_URL else "not configured"
-        }
+        return Response(content=_health_body(), media_type="application/json")
     except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
+        logger.error("Health check failed", exc_info=e)
         return {
             "status": "warning",
             "message": "Database connection failed. Using in-memory storage.",
@@ -77,7 +113,10 @@ async def health_check():
         }
 
 @app.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_for_access_token(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    now: datetime = Depends(now_utc),
+):
     """
     OAuth2 compatible token login, get an access token for future requests.
     """
@@ -90,23 +129,31 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         )
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username}, expires_delta=access_token_expires, now=now
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/register")
-async def register_user(user_data: UserCreate):
+async def register_user(user_data: UserCreate, now: datetime = Depends(now_utc)):
     """
     Register a new user.
     """
-    try:
-        user = await create_user(user_data)
-        return {"message": "User created successfully", "username": user.username}
-    except HTTPException as e:
-        raise e
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error creating user: {str(e)}")
+    user = await create_user(user_data, now=now)
+    return {"message": "User created successfully", "username": user.username}
 
 if __name__ == "__main__":
+    import os
     import uvicorn
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
+    # "auto" picks uvloop where it is installed (not available on Windows);
+    # use `uvicorn app.main:app --reload` for development
+    # Without Supabase each worker would get its own in-memory mock database,
+    # so users registered on one worker could not log in on another
+    supabase_configured = bool(settings.SUPABASE_URL and settings.SUPABASE_KEY)
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="auto",
+        http="httptools",
+        workers=os.cpu_count() if supabase_configured else 1,
+    )
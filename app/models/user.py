@@ -2,16 +2,22 @@
 User models and authentication utilities for the AI Financial Chatbot.
 """
 
+import asyncio
+import hashlib
+import time
 import uuid
-from typing import Optional, Dict, List, Any
-from pydantic import BaseModel, EmailStr, Field
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple
+from pydantic import BaseModel, ConfigDict, EmailStr
 from datetime import datetime, timedelta, timezone
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
+import jwt
+from jwt import InvalidTokenError
 from passlib.context import CryptContext
+from postgrest.exceptions import APIError
 
-from app.config import settings
+from app.config import get_settings
 from app.db.models import UserRepository
 
 # Password hashing
@@ -20,8 +26,17 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # OAuth2 setup
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Decoded access tokens, keyed by token digest: (expiry timestamp, username)
+TOKEN_CACHE_SIZE = 4096
+_token_cache: "OrderedDict[bytes, Tuple[float, str]]" = OrderedDict()
+
+# Models are immutable and reject unknown fields; assignment is never validated
+MODEL_CONFIG = ConfigDict(frozen=True, from_attributes=True, validate_assignment=False, extra="forbid")
+
 class UserBase(BaseModel):
     """Base user model."""
+    model_config = MODEL_CONFIG
+
     email: EmailStr
     username: str
     full_name: Optional[str] = None
@@ -37,30 +52,34 @@ class User(UserBase):
     is_premium: bool = False
     created_at: datetime
 
-    model_config = {
-        "from_attributes": True
-    }
-
 class UserInDB(User):
     """User model as stored in the database."""
     hashed_password: str
 
 class Token(BaseModel):
     """Token model."""
+    model_config = MODEL_CONFIG
+
     access_token: str
     token_type: str
 
 class TokenData(BaseModel):
     """Token data model."""
+    model_config = MODEL_CONFIG
+
     username: Optional[str] = None
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against a hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+def now_utc() -> datetime:
+    """Get the current UTC time once per request (FastAPI dependency)."""
+    return datetime.now(timezone.utc)
 
-def get_password_hash(password: str) -> str:
-    """Get password hash."""
-    return pwd_context.hash(password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against a hash, off the event loop."""
+    return await asyncio.to_thread(pwd_context.verify, plain_password, hashed_password)
+
+async def get_password_hash(password: str) -> str:
+    """Get password hash, off the event loop."""
+    return await asyncio.to_thread(pwd_context.hash, password)
 
 async def get_user(username: str) -> Optional[UserInDB]:
     """Get a user by username."""
@@ -70,13 +89,14 @@ async def get_user(username: str) -> Optional[UserInDB]:
             # Convert string timestamp to datetime
             if isinstance(user_dict.get("created_at"), str):
                 user_dict["created_at"] = datetime.fromisoformat(user_dict["created_at"].replace("Z", "+00:00"))
-            return UserInDB(**user_dict)
+            # Rows were validated on insert, so skip re-validating them on read
+            return UserInDB.model_construct(**user_dict)
         return None
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-async def create_user(user_data: UserCreate) -> User:
-    """Create a new user."""
+async def create_user(user_data: UserCreate, now: Optional[datetime] = None) -> User:
+    """Create a new user, stamped with the request time if given."""
     try:
         # Check if user already exists
         existing_user = await get_user(user_data.username)
@@ -84,9 +104,9 @@ async def create_user(user_data: UserCreate) -> User:
             raise HTTPException(status_code=400, detail="Username already registered")
 
         # Create user data for database
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await get_password_hash(user_data.password)
         user_id = str(uuid.uuid4())
-        created_at = datetime.now(timezone.utc)
+        created_at = now or datetime.now(timezone.utc)
 
         user_dict = {
             "id": user_id,
@@ -112,7 +132,8 @@ async def create_user(user_data: UserCreate) -> User:
             is_premium=False,
             created_at=created_at
         )
-    except HTTPException:
+    except (HTTPException, APIError):
+        # Database errors are mapped to responses by the app's exception handlers
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating user: {str(e)}")
@@ -122,24 +143,56 @@ async def authenticate_user(username: str, password: str) -> Optional[User]:
     user = await get_user(username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password(password, user.hashed_password):
         return None
     return user
 
-def create_access_token(data: Dict, expires_delta: Optional[timedelta] = None) -> str:
-    """Create an access token."""
+def create_access_token(
+    data: Dict,
+    expires_delta: Optional[timedelta] = None,
+    now: Optional[datetime] = None,
+) -> str:
+    """Create an access token, expiring relative to the request time if given."""
+    settings = get_settings()
     to_encode = data.copy()
+    now = now or datetime.now(timezone.utc)
 
     if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = now + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
 
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
     return encoded_jwt
 
+def _decode_token_username(token: str) -> Optional[str]:
+    """
+    Get the username from an access token, caching decoded tokens until they expire.
+
+    Raises:
+        InvalidTokenError: If the token is invalid
+    """
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    cached = _token_cache.get(key)
+    if cached:
+        if cached[0] > time.time():
+            _token_cache.move_to_end(key)
+            return cached[1]
+        # Expired; decoding below rejects the token
+        del _token_cache[key]
+
+    settings = get_settings()
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    username = payload.get("sub")
+    expire = payload.get("exp")
+    if username is not None and expire is not None:
+        _token_cache[key] = (float(expire), username)
+        if len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    return username
+
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     """Get the current user from a token."""
     credentials_exception = HTTPException(
@@ -149,12 +202,11 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     )
 
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
+        username = _decode_token_username(token)
         if username is None:
             raise credentials_exception
         token_data = TokenData(username=username)
-    except JWTError:
+    except InvalidTokenError:
         raise credentials_exception
 
     user = await get_user(token_data.username)
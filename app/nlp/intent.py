@@ -6,20 +6,26 @@ Analyzes user messages to determine their intent.
 import os
 import logging
 import re
-from typing import Tuple, List, Dict, Optional, Callable
-import pickle
+from typing import Tuple, List, Dict, FrozenSet, Optional, Callable
 
+import joblib
+import numpy as np
+from cachetools import LRUCache
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.pipeline import Pipeline
 
-from app.config import settings
+from app.config import get_settings
+from app.nlp.message import TokenizedMessage
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Maximum number of distinct messages to remember classification results for
+CLASSIFY_CACHE_SIZE = 4096
+
 # Simple tokenizer and stopwords as fallback
-SIMPLE_STOPWORDS = set([
+SIMPLE_STOPWORDS = frozenset([
     'a', 'an', 'the', 'and', 'or', 'but', 'if', 'because', 'as', 'what',
     'which', 'this', 'that', 'these', 'those', 'then', 'just', 'so', 'than',
     'such', 'both', 'through', 'about', 'for', 'is', 'of', 'while', 'during',
@@ -41,42 +47,128 @@ def simple_tokenize(text: str) -> List[str]:
     """Simple tokenizer that splits on non-alphanumeric characters."""
     return [token.lower() for token in re.findall(r'\w+', text)]
 
-# Try to import NLTK, but use simple tokenizer if not available
+# Use NLTK only if its data is already installed (see scripts/download_nltk_data.py);
+# never download at import time
 try:
-    import nltk
     from nltk.tokenize import word_tokenize
     from nltk.corpus import stopwords
 
-    # Ensure NLTK resources are downloaded
-    try:
-        nltk.data.find('tokenizers/punkt')
-        nltk.data.find('corpora/stopwords')
-
-        # Use NLTK tokenizer and stopwords
-        tokenizer: Callable = word_tokenize
-        stop_words: List[str] = stopwords.words('english')
-        logger.info("Using NLTK tokenizer and stopwords")
-
-    except LookupError:
-        # Try to download NLTK data
-        try:
-            nltk.download('punkt')
-            nltk.download('stopwords')
-            tokenizer = word_tokenize
-            stop_words = stopwords.words('english')
-            logger.info("Downloaded NLTK data, using NLTK tokenizer and stopwords")
-        except Exception as e:
-            # Fall back to simple tokenizer
-            logger.warning(f"Could not download NLTK data: {str(e)}")
-            tokenizer = simple_tokenize
-            stop_words = list(SIMPLE_STOPWORDS)
-            logger.info("Using simple tokenizer and stopwords")
+    # Raises LookupError if the tokenizer models or stopwords are missing
+    word_tokenize("hello world")
+    tokenizer: Callable = word_tokenize
+    stop_words: FrozenSet[str] = frozenset(stopwords.words('english'))
+    logger.info("Using NLTK tokenizer and stopwords")
 
 except ImportError:
     # Fall back to simple tokenizer
     logger.warning("NLTK not available, using simple tokenizer and stopwords")
     tokenizer = simple_tokenize
-    stop_words = list(SIMPLE_STOPWORDS)
+    stop_words = SIMPLE_STOPWORDS
+
+except LookupError:
+    # Fall back to simple tokenizer
+    logger.warning("NLTK data not found, using simple tokenizer and stopwords "
+                   "(run scripts/download_nltk_data.py to install it)")
+    tokenizer = simple_tokenize
+    stop_words = SIMPLE_STOPWORDS
+
+# Example training data for the default model
+DEFAULT_TRAINING_DATA: List[Tuple[str, str]] = [
+    # stock_price intent
+    ("What's the current price of Apple stock?", "stock_price"),
+    ("How much is MSFT trading for?", "stock_price"),
+    ("Tell me the stock price of Amazon", "stock_price"),
+
+    # market_info intent
+    ("How is the market performing today?", "market_info"),
+    ("What's the current state of the S&P 500?", "market_info"),
+    ("Tell me about today's market trends", "market_info"),
+
+    # financial_advice intent
+    ("Should I invest in tech stocks?", "financial_advice"),
+    ("What's a good investment strategy for retirement?", "financial_advice"),
+    ("How should I diversify my portfolio?", "financial_advice"),
+
+    # portfolio_management intent
+    ("Show me my portfolio performance", "portfolio_management"),
+    ("What's my current balance?", "portfolio_management"),
+    ("How are my investments doing?", "portfolio_management"),
+
+    # general_question intent
+    ("What is a stock?", "general_question"),
+    ("Explain what a bond is", "general_question"),
+    ("How do dividends work?", "general_question"),
+
+    # greeting intent
+    ("Hello", "greeting"),
+    ("Hi there", "greeting"),
+    ("Good morning", "greeting"),
+
+    # goodbye intent
+    ("Goodbye", "goodbye"),
+    ("Bye", "goodbye"),
+    ("See you later", "goodbye"),
+]
+
+# Default model built by scripts/build_intent_model.py, used when no model
+# exists at NLP_MODEL_PATH so deployments do not train on startup
+BUNDLED_MODEL_PATH = os.path.join(os.path.dirname(__file__), "_default_intent.joblib")
+
+# Confidence reported for keyword matches when no model is loaded
+KEYWORD_CONFIDENCE = 0.9
+
+# Whole messages that are answered without consulting the model
+FAST_INTENTS: Dict[str, Tuple[str, float]] = {
+    "hi": ("greeting", 0.95),
+    "hey": ("greeting", 0.95),
+    "hello": ("greeting", 0.95),
+    "greetings": ("greeting", 0.95),
+    "bye": ("goodbye", 0.95),
+    "goodbye": ("goodbye", 0.95),
+}
+
+# Hand-picked words that on their own identify an intent. Words learned from
+# the few training phrases are too common (e.g. "see", "show", "today") to
+# be trusted without the model, and "price" alone does not make a stock quote
+# (e.g. "What is the price of a bond?").
+KEYWORD_INTENTS: Dict[str, str] = {
+    # greeting
+    "hello": "greeting",
+    "hi": "greeting",
+    "hey": "greeting",
+    "greetings": "greeting",
+
+    # goodbye
+    "bye": "goodbye",
+    "goodbye": "goodbye",
+
+    # stock_price: the companies FinancialService knows
+    "apple": "stock_price",
+    "aapl": "stock_price",
+    "microsoft": "stock_price",
+    "msft": "stock_price",
+    "amazon": "stock_price",
+    "amzn": "stock_price",
+    "google": "stock_price",
+    "googl": "stock_price",
+    "tesla": "stock_price",
+    "tsla": "stock_price",
+
+    # market_info
+    "market": "market_info",
+    "nasdaq": "market_info",
+    "dow": "market_info",
+
+    # financial_advice
+    "advice": "financial_advice",
+    "retirement": "financial_advice",
+    "invest": "financial_advice",
+    "investing": "financial_advice",
+}
+
+# Keyword intents that give way to any other matched keyword, so that
+# "hello, what is the price of AAPL?" is a stock question
+SMALL_TALK_INTENTS = frozenset(["greeting", "goodbye"])
 
 class IntentClassifier:
     """
@@ -91,8 +183,12 @@ class IntentClassifier:
         Args:
             model_path: Path to the saved model file
         """
-        self.model_path = model_path or settings.NLP_MODEL_PATH
+        self.model_path = model_path or get_settings().NLP_MODEL_PATH
         self.model = None
+        self._cache: LRUCache = LRUCache(maxsize=CLASSIFY_CACHE_SIZE)
+
+        # Keyword fast path, looked up by message token
+        self.keywords = KEYWORD_INTENTS
         self.intents = [
             "stock_price",
             "market_info",
@@ -112,102 +208,140 @@ class IntentClassifier:
             self._train_default_model()
 
     def _load_model(self) -> None:
-        """Load the model from disk if it exists."""
-        try:
-            if os.path.exists(self.model_path):
-                with open(self.model_path, 'rb') as f:
-                    self.model = pickle.load(f)
-                logger.info(f"Loaded intent classification model from {self.model_path}")
-            else:
-                logger.warning(f"Model file not found at {self.model_path}")
-        except Exception as e:
-            logger.error(f"Error loading model: {str(e)}")
+        """Load the model from disk, falling back to the one built with the package."""
+        for path in (self.model_path, BUNDLED_MODEL_PATH):
+            if not os.path.exists(path):
+                logger.warning(f"Model file not found at {path}")
+                continue
+            try:
+                # Memory-map the model arrays so forked workers share them
+                self.model = joblib.load(path, mmap_mode='r')
+                self._prepare_arrays()
+                logger.info(f"Loaded intent classification model from {path}")
+                return
+            except Exception as e:
+                logger.error("Error loading model", exc_info=e)
+                self.model = None
+
+    def _prepare_arrays(self) -> None:
+        """Extract the fitted pipeline's parameters for dense NumPy inference."""
+        vectorizer = self.model.named_steps['tfidf']
+        clf = self.model.named_steps['clf']
+
+        self.analyzer = vectorizer.build_analyzer()
+        self.vocab: Dict[str, int] = vectorizer.vocabulary_
+        self.idf = vectorizer.idf_
+        self.log_prob = clf.feature_log_prob_
+        self.log_prior = clf.class_log_prior_
+        self.classes_ = clf.classes_
+
+    def _predict_proba(self, text: str) -> np.ndarray:
+        """
+        Compute class probabilities for a message.
+
+        Equivalent to the pipeline's predict_proba (L2-normalized TF-IDF
+        followed by multinomial naive Bayes) without the sparse matrix and
+        sklearn dispatch overhead.
+
+        Args:
+            text: The user's message
+
+        Returns:
+            np.ndarray: Probability of each class in self.classes_
+        """
+        # Count in-vocabulary tokens with a single C-level bincount
+        vocab = self.vocab
+        indices = np.array([vocab[token] for token in self.analyzer(text) if token in vocab], dtype=np.intp)
+        tfidf = np.bincount(indices, minlength=len(vocab)).astype(self.idf.dtype)
+        tfidf *= self.idf
+        norm = np.linalg.norm(tfidf)
+        if norm:
+            tfidf /= norm
+
+        scores = self.log_prob @ tfidf + self.log_prior
+        proba = np.exp(scores - scores.max())
+        return proba / proba.sum()
 
     def _train_default_model(self) -> None:
         """Train a simple default model with example phrases."""
         logger.info("Training default intent classification model")
 
-        # Example training data
-        training_data = [
-            # stock_price intent
-            ("What's the current price of Apple stock?", "stock_price"),
-            ("How much is MSFT trading for?", "stock_price"),
-            ("Tell me the stock price of Amazon", "stock_price"),
-
-            # market_info intent
-            ("How is the market performing today?", "market_info"),
-            ("What's the current state of the S&P 500?", "market_info"),
-            ("Tell me about today's market trends", "market_info"),
-
-            # financial_advice intent
-            ("Should I invest in tech stocks?", "financial_advice"),
-            ("What's a good investment strategy for retirement?", "financial_advice"),
-            ("How should I diversify my portfolio?", "financial_advice"),
-
-            # portfolio_management intent
-            ("Show me my portfolio performance", "portfolio_management"),
-            ("What's my current balance?", "portfolio_management"),
-            ("How are my investments doing?", "portfolio_management"),
-
-            # general_question intent
-            ("What is a stock?", "general_question"),
-            ("Explain what a bond is", "general_question"),
-            ("How do dividends work?", "general_question"),
-
-            # greeting intent
-            ("Hello", "greeting"),
-            ("Hi there", "greeting"),
-            ("Good morning", "greeting"),
-
-            # goodbye intent
-            ("Goodbye", "goodbye"),
-            ("Bye", "goodbye"),
-            ("See you later", "goodbye"),
-        ]
-
         # Prepare data
-        X = [item[0] for item in training_data]
-        y = [item[1] for item in training_data]
+        X = [item[0] for item in DEFAULT_TRAINING_DATA]
+        y = [item[1] for item in DEFAULT_TRAINING_DATA]
 
         # Create and train the model
         self.model = Pipeline([
-            ('tfidf', TfidfVectorizer(tokenizer=tokenizer, stop_words=stop_words)),
+            ('tfidf', TfidfVectorizer(tokenizer=tokenizer, stop_words=sorted(stop_words))),
             ('clf', MultinomialNB())
         ])
 
         self.model.fit(X, y)
 
+        # float32 halves the model's size and is plenty for scoring intents
+        vectorizer = self.model.named_steps['tfidf']
+        clf = self.model.named_steps['clf']
+        vectorizer.idf_ = vectorizer.idf_.astype(np.float32)
+        clf.feature_log_prob_ = clf.feature_log_prob_.astype(np.float32)
+        clf.class_log_prior_ = clf.class_log_prior_.astype(np.float32)
+
+        self._prepare_arrays()
+        self._cache.clear()
+
         # Save the model
         os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
-        with open(self.model_path, 'wb') as f:
-            pickle.dump(self.model, f)
+        joblib.dump(self.model, self.model_path)
 
         logger.info(f"Trained and saved default model to {self.model_path}")
 
-    def classify(self, text: str) -> Tuple[str, float]:
+    def classify(self, message: TokenizedMessage) -> Tuple[str, float]:
         """
         Classify the intent of a user message.
 
         Args:
-            text: The user's message
+            message: The user's tokenized message
 
         Returns:
             Tuple[str, float]: The predicted intent and confidence score
         """
-        if self.model is None:
-            logger.warning("Model not loaded, returning default intent")
+        # Empty, single-character and one-word greeting messages need no model
+        tokens = message.tokens
+        if len(message.lower) < 2 or not tokens:
             return "unknown", 0.0
+        if len(tokens) == 1 and tokens[0] in FAST_INTENTS:
+            return FAST_INTENTS[tokens[0]]
 
-        # Make prediction
-        intent = self.model.predict([text])[0]
+        # Keywords pick the intent when they agree, ignoring small talk next
+        # to a real question
+        keywords = self.keywords
+        matched_intents = {keywords[token] for token in tokens if token in keywords}
+        if len(matched_intents) > 1:
+            matched_intents -= SMALL_TALK_INTENTS
+        keyword_intent = matched_intents.pop() if len(matched_intents) == 1 else None
 
-        # Get confidence (probability of the predicted class)
-        try:
-            proba = self.model.predict_proba([text])[0]
-            confidence = max(proba)
-        except:
-            # If probabilities aren't available
-            confidence = 0.7  # Default confidence
+        if self.model is None:
+            if keyword_intent is not None:
+                return keyword_intent, KEYWORD_CONFIDENCE
+            logger.warning("Model not loaded, returning default intent")
+            return "unknown", 0.0
 
-        logger.info(f"Classified '{text}' as '{intent}' with confidence {confidence:.2f}")
-        return intent, float(confidence)
+        # The vectorizer lowercases its input, so normalized texts share results
+        key = message.lower
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        # Make prediction; the predicted class is the most probable one, so a
+        # single predict_proba pass gives both the intent and its confidence.
+        # A keyword match overrides the prediction but keeps the model's
+        # probability for that intent as its confidence.
+        proba = self._predict_proba(key)
+        matches = np.flatnonzero(self.classes_ == keyword_intent)
+        index = int(matches[0]) if matches.size else int(proba.argmax())
+        intent = str(self.classes_[index])
+        confidence = proba[index]
+
+        logger.info(f"Classified '{message.raw}' as '{intent}' with confidence {confidence:.2f}")
+        result = (intent, float(confidence))
+        self._cache[key] = result
+        return result
@@ -0,0 +1,36 @@
+"""
+Tokenized chat messages for the AI Financial Chatbot.
+A message is normalized and split into words once per request and then shared
+by the intent classifier and the financial service.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Tuple
+
+# Word tokens, matching simple_tokenize in app.nlp.intent
+TOKEN_PATTERN = re.compile(r'\w+')
+
+@dataclass(frozen=True, slots=True)
+class TokenizedMessage:
+    """
+    A user message together with its normalized text and word tokens.
+    """
+
+    raw: str
+    lower: str
+    tokens: Tuple[str, ...]
+
+    @classmethod
+    def from_text(cls, text: str) -> "TokenizedMessage":
+        """
+        Tokenize a user message.
+
+        Args:
+            text: The user's message
+
+        Returns:
+            TokenizedMessage: The message with stripped, lowercased text and its word tokens
+        """
+        lower = text.strip().lower()
+        return cls(raw=text, lower=lower, tokens=tuple(TOKEN_PATTERN.findall(lower)))
@@ -3,13 +3,16 @@ Chat API routes for the AI Financial Chatbot.
 Handles user message processing and response generation.
 """
 
+import asyncio
 import logging
+from functools import lru_cache
 from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
-from typing import Dict, List, Optional, Tuple
-from datetime import datetime, timezone
+from postgrest.exceptions import APIError
+from pydantic import BaseModel, ConfigDict, Field, StringConstraints
+from typing import Annotated, Dict, List, Optional, Tuple
 
 from app.nlp.intent import IntentClassifier
+from app.nlp.message import TokenizedMessage
 from app.services.financial_api import FinancialService
 from app.models.user import User, get_current_user
 from app.db.models import ChatHistoryRepository
@@ -23,51 +26,65 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# Initialize services
-try:
-    intent_classifier = IntentClassifier()
-except Exception as e:
-    # Create a simple mock classifier if the real one fails
-    from app.nlp.intent import IntentClassifier
-
-    class MockIntentClassifier:
-        def classify(self, text: str) -> Tuple[str, float]:
-            """Simple mock classifier that returns greeting or unknown."""
-            text_lower = text.lower()
-            if any(greeting in text_lower for greeting in ["hello", "hi", "hey", "greetings"]):
-                return "greeting", 0.9
-            elif any(word in text_lower for word in ["bye", "goodbye", "see you"]):
-                return "goodbye", 0.9
-            elif "stock" in text_lower and "price" in text_lower:
-                return "stock_price", 0.8
-            elif "market" in text_lower:
-                return "market_info", 0.8
-            elif "advice" in text_lower or "invest" in text_lower:
-                return "financial_advice", 0.8
-            else:
-                return "unknown", 0.5
-
-    logger.warning(f"Failed to initialize IntentClassifier: {str(e)}. Using mock classifier.")
-    intent_classifier = MockIntentClassifier()
-
-financial_service = FinancialService()
+class MockIntentClassifier:
+    """Keyword-based classifier used if the real one fails to initialize."""
+
+    def classify(self, message: TokenizedMessage) -> Tuple[str, float]:
+        """Simple mock classifier that returns greeting or unknown."""
+        text_lower = message.lower
+        if any(greeting in text_lower for greeting in ["hello", "hi", "hey", "greetings"]):
+            return "greeting", 0.9
+        elif any(word in text_lower for word in ["bye", "goodbye", "see you"]):
+            return "goodbye", 0.9
+        elif "stock" in text_lower and "price" in text_lower:
+            return "stock_price", 0.8
+        elif "market" in text_lower:
+            return "market_info", 0.8
+        elif "advice" in text_lower or "invest" in text_lower:
+            return "financial_advice", 0.8
+        else:
+            return "unknown", 0.5
+
+# Services are created on first use and shared by all requests
+@lru_cache(maxsize=1)
+def get_intent_classifier():
+    """Get the shared intent classifier, loading its model on first use."""
+    try:
+        return IntentClassifier()
+    except Exception as e:
+        logger.warning(f"Failed to initialize IntentClassifier: {str(e)}. Using mock classifier.")
+        return MockIntentClassifier()
+
+@lru_cache(maxsize=1)
+def get_financial_service() -> FinancialService:
+    """Get the shared financial service."""
+    return FinancialService()
+
+# Longest message accepted from a user, in characters
+MAX_MESSAGE_LENGTH = 2048
 
 class Message(BaseModel):
     """Message model for chat requests."""
-    text: str
-    context: Optional[Dict] = {}
+    model_config = ConfigDict(frozen=True, extra="forbid", str_strip_whitespace=True)
+
+    text: Annotated[str, StringConstraints(max_length=MAX_MESSAGE_LENGTH)]
+    context: Optional[Dict] = Field(default_factory=dict)
 
 class ChatResponse(BaseModel):
     """Response model for chat API."""
+    model_config = ConfigDict(frozen=True)
+
     response: str
     intent: str
     confidence: float
     data: Optional[Dict] = None
 
-@router.post("/message", response_model=ChatResponse)
+@router.post("/message", response_model=ChatResponse, response_model_exclude_none=True)
 async def process_message(
     message: Message,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    intent_classifier=Depends(get_intent_classifier),
+    financial_service: FinancialService = Depends(get_financial_service)
 ) -> ChatResponse:
     """
     Process a user message and generate a response.
@@ -75,40 +92,52 @@ async def process_message(
     Args:
         message: The user's message
         current_user: The authenticated user
+        intent_classifier: The shared intent classifier
+        financial_service: The shared financial service
 
     Returns:
         ChatResponse: The chatbot's response
     """
     try:
-        # Classify the intent of the message
-        intent, confidence = intent_classifier.classify(message.text)
-
-        # Get financial data if needed
-        data = None
-        if intent in ["stock_price", "market_info", "financial_advice"]:
-            data = await financial_service.get_data(intent, message.text, message.context)
+        # Tokenize the message once for classification and data lookup
+        tokenized = TokenizedMessage.from_text(message.text)
 
-        # Generate response based on intent and data
-        response = financial_service.generate_response(intent, message.text, data)
+        # Classify the intent of the message
+        intent, confidence = intent_classifier.classify(tokenized)
 
-        # Save user message to chat history
-        await ChatHistoryRepository.add_message({
+        # Save the user message in a worker thread while the response is
+        # prepared; it does not depend on the response. Both rows are stamped
+        # by the database, and the bot row is only inserted after this one.
+        user_write = asyncio.create_task(ChatHistoryRepository.add_messages([{
             "user_id": current_user.id,
             "role": "user",
             "message": message.text,
-            "intent": intent,
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        })
-
-        # Save bot response to chat history
-        await ChatHistoryRepository.add_message({
+            "intent": intent
+        }], return_rows=False))
+        # Yield once so the write is handed to its thread before the CPU-bound
+        # response work below starts
+        await asyncio.sleep(0)
+
+        try:
+            # Get financial data if needed
+            data = None
+            if intent in ["stock_price", "market_info", "financial_advice"]:
+                data = await financial_service.get_data(intent, tokenized, message.context)
+
+            # Generate response based on intent and data
+            response = financial_service.generate_response(intent, tokenized, data)
+        finally:
+            # Never leave the write orphaned, even if the response failed
+            await user_write
+
+        # Save bot response without reading the row back
+        await ChatHistoryRepository.add_messages([{
             "user_id": current_user.id,
             "role": "bot",
             "message": response,
             "intent": intent,
-            "data": data,
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        })
+            "data": data
+        }], return_rows=False)
 
         return ChatResponse(
             response=response,
@@ -117,8 +146,13 @@ async def process_message(
             data=data
         )
 
+    except APIError:
+        # Handled by the app's database error handler
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing message: {str(e)}")
+        # Log the cause here; clients get no internal details
+        logger.error("Error processing message", exc_info=e)
+        raise HTTPException(status_code=500, detail="Error processing message") from e
 
 @router.get("/history", response_model=List[Dict])
 async def get_chat_history(
@@ -139,5 +173,8 @@ async def get_chat_history(
         # Fetch chat history from database
         history = await ChatHistoryRepository.get_user_chat_history(current_user.id, limit)
         return history
+    except APIError:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error retrieving chat history: {str(e)}")
+        logger.error("Error retrieving chat history", exc_info=e)
+        raise HTTPException(status_code=500, detail="Error retrieving chat history") from e
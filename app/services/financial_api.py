@@ -5,15 +5,71 @@ Handles interactions with external financial data APIs.
 
 import logging
 import json
-from typing import Dict, Any, Optional, List
+from typing import Callable, Dict, Any, Optional, List
 import httpx
 import re
 
-from app.config import settings
+from app.config import get_settings
+from app.nlp.message import TokenizedMessage
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Stock symbol regex pattern
+SYMBOL_PATTERN = re.compile(r'\b[A-Z]{1,5}\b')
+
+# Financial advice topics, detected in one pass over the lowercased message;
+# like plain substring checks, "retire" also matches "retirement"
+ADVICE_TOPIC_PATTERN = re.compile(
+    r'(?P<retirement>retire)|(?P<beginner>beginner|start)|(?P<invest>invest)|(?P<dividend>dividend)'
+)
+
+# Generic advice for each topic
+ADVICE = {
+    "retirement": "For retirement planning, consider a diversified portfolio with a mix of stocks and bonds. The general rule is to subtract your age from 110 to get the percentage to allocate to stocks.",
+    "beginner_investing": "For beginners, consider starting with index funds which provide broad market exposure with lower fees. Establish an emergency fund before investing.",
+    "dividend_investing": "Dividend investing can provide regular income. Look for companies with a history of stable or increasing dividend payments and reasonable payout ratios.",
+    "general": "It's important to have a diversified portfolio that aligns with your risk tolerance and financial goals. Consider consulting with a financial advisor for personalized advice.",
+}
+
+# Common company names and their stock symbols
+# This would be more sophisticated in a real implementation
+COMPANY_SYMBOLS = {
+    "apple": "AAPL",
+    "microsoft": "MSFT",
+    "amazon": "AMZN",
+    "google": "GOOGL",
+    "tesla": "TSLA"
+}
+
+def _stock_price_response(data: Dict) -> str:
+    """Describe a stock quote."""
+    return f"The current price of {data['symbol']} is ${data['price']:.2f}, which is {data['change_percent']:.1f}% {('up' if data['change'] > 0 else 'down')} today."
+
+def _market_info_response(data: Dict) -> str:
+    """Summarize the leading market index."""
+    indices = data.get("indices", [])
+    if not indices:
+        return "I couldn't find specific market information at the moment."
+    index = indices[0]
+    index_info = f"The {index['name']} is currently at {index['value']:.2f}, {index['change_percent']:.1f}% {('up' if index['change_percent'] > 0 else 'down')}."
+    return f"Here's the latest market information: {index_info} The market is currently {data.get('market_status', 'unknown')}."
+
+# Responses for intents that are answered from retrieved data
+_DATA_RESPONSES: Dict[str, Callable[[Dict], str]] = {
+    "stock_price": _stock_price_response,
+    "market_info": _market_info_response,
+    "financial_advice": lambda data: f"{data['advice']} {data['disclaimer']}",
+}
+
+# Responses that do not depend on any data
+_STATIC_RESPONSES: Dict[str, str] = {
+    "greeting": "Hello! I'm your financial assistant. How can I help you with your financial questions today?",
+    "goodbye": "Goodbye! Feel free to come back if you have more financial questions.",
+}
+
+DEFAULT_RESPONSE = "I'm not sure how to respond to that. Could you try rephrasing your question about financial matters?"
+
 class FinancialService:
     """
     Service for interacting with financial APIs and generating responses.
@@ -27,19 +83,17 @@ class FinancialService:
             api_key: API key for the financial data provider
             api_url: Base URL for the financial data API
         """
+        settings = get_settings()
         self.api_key = api_key or settings.FINANCIAL_API_KEY
         self.api_url = api_url or settings.FINANCIAL_API_URL
-        
-        # Stock symbol regex pattern
-        self.symbol_pattern = re.compile(r'\b[A-Z]{1,5}\b')
     
-    async def get_data(self, intent: str, message: str, context: Dict = None) -> Dict:
+    async def get_data(self, intent: str, message: TokenizedMessage, context: Dict = None) -> Dict:
         """
         Get financial data based on the user's intent and message.
         
         Args:
             intent: The classified intent of the user's message
-            message: The user's message
+            message: The user's tokenized message
             context: Additional context for the request
             
         Returns:
@@ -55,38 +109,25 @@ class FinancialService:
             else:
                 return {}
         except Exception as e:
-            logger.error(f"Error getting financial data: {str(e)}")
+            logger.error("Error getting financial data", exc_info=e)
             return {"error": str(e)}
     
-    async def _get_stock_price(self, message: str) -> Dict:
+    async def _get_stock_price(self, message: TokenizedMessage) -> Dict:
         """
         Get stock price data for a symbol mentioned in the message.
         
         Args:
-            message: The user's message
+            message: The user's tokenized message
             
         Returns:
             Dict: Stock price data
         """
         # Extract potential stock symbols from the message
-        symbols = self.symbol_pattern.findall(message)
+        symbols = SYMBOL_PATTERN.findall(message.raw)
         
         # If no symbols found, look for company names
         if not symbols:
-            # This would be more sophisticated in a real implementation
-            common_companies = {
-                "apple": "AAPL",
-                "microsoft": "MSFT",
-                "amazon": "AMZN",
-                "google": "GOOGL",
-                "tesla": "TSLA"
-            }
-            
-            message_lower = message.lower()
-            for company, symbol in common_companies.items():
-                if company in message_lower:
-                    symbols = [symbol]
-                    break
+            symbols = [COMPANY_SYMBOLS[token] for token in message.tokens if token in COMPANY_SYMBOLS]
         
         if not symbols:
             return {"error": "No stock symbol found in the message"}
@@ -135,34 +176,29 @@ class FinancialService:
         logger.info("Retrieved market information")
         return mock_data
     
-    def _get_financial_advice(self, message: str) -> Dict:
+    def _get_financial_advice(self, message: TokenizedMessage) -> Dict:
         """
         Generate financial advice based on the user's message.
         
         Args:
-            message: The user's message
+            message: The user's tokenized message
             
         Returns:
             Dict: Financial advice data
         """
         # In a real implementation, this might use a more sophisticated NLP model
-        # For now, return generic advice
-        
-        # Detect some common financial advice topics
-        message_lower = message.lower()
-        
-        if "retire" in message_lower or "retirement" in message_lower:
+        # For now, return generic advice for the highest-priority topic mentioned
+        topics = {match.lastgroup for match in ADVICE_TOPIC_PATTERN.finditer(message.lower)}
+
+        if "retirement" in topics:
             advice_type = "retirement"
-            advice = "For retirement planning, consider a diversified portfolio with a mix of stocks and bonds. The general rule is to subtract your age from 110 to get the percentage to allocate to stocks."
-        elif "invest" in message_lower and ("beginner" in message_lower or "start" in message_lower):
+        elif "invest" in topics and "beginner" in topics:
             advice_type = "beginner_investing"
-            advice = "For beginners, consider starting with index funds which provide broad market exposure with lower fees. Establish an emergency fund before investing."
-        elif "dividend" in message_lower:
+        elif "dividend" in topics:
             advice_type = "dividend_investing"
-            advice = "Dividend investing can provide regular income. Look for companies with a history of stable or increasing dividend payments and reasonable payout ratios."
         else:
             advice_type = "general"
-            advice = "It's important to have a diversified portfolio that aligns with your risk tolerance and financial goals. Consider consulting with a financial advisor for personalized advice."
+        advice = ADVICE[advice_type]
         
         return {
             "type": advice_type,
@@ -170,39 +206,24 @@ class FinancialService:
             "disclaimer": "This is general advice and not personalized to your specific financial situation."
         }
     
-    def generate_response(self, intent: str, message: str, data: Dict = None) -> str:
+    def generate_response(self, intent: str, message: TokenizedMessage, data: Dict = None) -> str:
         """
         Generate a natural language response based on intent and data.
         
         Args:
             intent: The classified intent
-            message: The user's original message
+            message: The user's tokenized message
             data: The retrieved financial data
             
         Returns:
             str: The generated response
         """
-        if data and "error" in data:
-            return f"I'm sorry, I couldn't get that information. {data['error']}"
-        
-        if intent == "stock_price" and data:
-            return f"The current price of {data['symbol']} is ${data['price']:.2f}, which is {data['change_percent']:.1f}% {('up' if data['change'] > 0 else 'down')} today."
-        
-        elif intent == "market_info" and data:
-            indices = data.get("indices", [])
-            if indices:
-                index_info = f"The {indices[0]['name']} is currently at {indices[0]['value']:.2f}, {indices[0]['change_percent']:.1f}% {('up' if indices[0]['change_percent'] > 0 else 'down')}."
-                return f"Here's the latest market information: {index_info} The market is currently {data.get('market_status', 'unknown')}."
-            return "I couldn't find specific market information at the moment."
-        
-        elif intent == "financial_advice" and data:
-            return f"{data['advice']} {data['disclaimer']}"
-        
-        elif intent == "greeting":
-            return "Hello! I'm your financial assistant. How can I help you with your financial questions today?"
-        
-        elif intent == "goodbye":
-            return "Goodbye! Feel free to come back if you have more financial questions."
-        
-        else:
-            return "I'm not sure how to respond to that. Could you try rephrasing your question about financial matters?"
+        if data:
+            if "error" in data:
+                return f"I'm sorry, I couldn't get that information. {data['error']}"
+
+            respond = _DATA_RESPONSES.get(intent)
+            if respond:
+                return respond(data)
+
+        return _STATIC_RESPONSES.get(intent, DEFAULT_RESPONSE)
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Build the default intent classification model for the AI Financial Chatbot.
+Trains the classifier on the built-in example phrases and saves it inside the
+app package, so the server loads it instead of training on first start.
+"""
+
+import os
+import sys
+import logging
+import tempfile
+
+# Add the parent directory to the path so we can import from app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.nlp.intent import BUNDLED_MODEL_PATH, IntentClassifier
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+def build_intent_model():
+    """Train the default model and write it to BUNDLED_MODEL_PATH."""
+    if os.path.exists(BUNDLED_MODEL_PATH):
+        os.remove(BUNDLED_MODEL_PATH)
+
+    # Train into a temporary location, then move the result into the package
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_path = os.path.join(tmp_dir, "intent_classifier")
+        IntentClassifier(model_path=model_path)
+        os.replace(model_path, BUNDLED_MODEL_PATH)
+
+    logger.info(f"Saved default intent model to {BUNDLED_MODEL_PATH}")
+
+if __name__ == "__main__":
+    build_intent_model()
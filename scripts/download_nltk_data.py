@@ -1,19 +1,36 @@
 #!/usr/bin/env python3
 """
 Download required NLTK data for the AI Financial Chatbot.
+
+Resources that are already installed are skipped, so the script is safe to
+run on every deploy. Set NLTK_DATA to download into a shared directory.
 """
 
+import os
+
 import nltk
 
+# (resource path, package name); punkt_tab is used by newer NLTK releases
+NLTK_RESOURCES = [
+    ('tokenizers/punkt', 'punkt'),
+    ('tokenizers/punkt_tab', 'punkt_tab'),
+    ('corpora/stopwords', 'stopwords'),
+]
+
 def download_nltk_data():
-    """Download required NLTK data."""
-    print("Downloading NLTK data...")
-    
-    # Download required NLTK data
-    nltk.download('punkt')
-    nltk.download('stopwords')
-    
-    print("NLTK data downloaded successfully.")
+    """Download required NLTK data that is not already installed."""
+    download_dir = os.environ.get('NLTK_DATA')
+
+    for resource, package in NLTK_RESOURCES:
+        try:
+            nltk.data.find(resource)
+            print(f"NLTK '{package}' already installed, skipping.")
+        except LookupError:
+            print(f"Downloading NLTK '{package}'...")
+            if not nltk.download(package, download_dir=download_dir, quiet=True, raise_on_error=False):
+                print(f"Could not download NLTK '{package}'.")
+
+    print("NLTK data is ready.")
 
 if __name__ == "__main__":
     download_nltk_data()
@@ -6,16 +6,17 @@ Creates the necessary tables in Supabase.
 
 import os
 import sys
+import uuid
 import logging
 import asyncio
-from datetime import datetime, timezone
-from passlib.context import CryptContext
+
+import asyncpg
 
 # Add the parent directory to the path so we can import from app
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app.config import settings
-from app.db.database import supabase_client
+from app.config import get_settings
+from app.db.database import TEST_USER_HASHED_PASSWORD
 
 # Configure logging
 logging.basicConfig(
@@ -24,17 +25,53 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+settings = get_settings()
+
+# Users created by setup, as (id, username, email, full_name, hashed_password,
+# is_active, is_premium) rows; created_at is filled in by the database
+SEED_USERS = [
+    (
+        uuid.UUID("00000000-0000-0000-0000-000000000001"),
+        "testuser",
+        "test@example.com",
+        "Test User",
+        TEST_USER_HASHED_PASSWORD,  # precomputed hash of "password123"
+        True,
+        False,
+    ),
+]
+
+# Seconds allowed for building an index on a populated table; longer than
+# the pool's default command timeout
+INDEX_BUILD_TIMEOUT = 3600
+
+async def create_pool() -> asyncpg.Pool:
+    """
+    Create a connection pool to Supabase's Postgres database.
+
+    Uses the Postgres wire protocol directly instead of the REST API, which
+    cannot run DDL. Supabase limits connections, so the pool stays small.
 
-async def create_tables():
+    Returns:
+        asyncpg.Pool: The connection pool
+    """
+    return await asyncpg.create_pool(
+        settings.SUPABASE_DB_URL,
+        min_size=2,
+        max_size=10,
+        command_timeout=30,
+        max_inactive_connection_lifetime=300,
+    )
+
+async def create_tables(pool: asyncpg.Pool):
     """Create the necessary tables in Supabase."""
     try:
-        # Create users table
-        logger.info("Creating users table...")
+        # Users table, then chat_history which references it; both are sent
+        # as one multi-statement script in a single round-trip
+        logger.info("Creating users and chat_history tables...")
         
         # Using raw SQL with Supabase's PostgreSQL
-        users_table_sql = """
+        tables_sql = """
         CREATE TABLE IF NOT EXISTS users (
             id UUID PRIMARY KEY,
             username TEXT UNIQUE NOT NULL,
@@ -45,11 +82,7 @@ async def create_tables():
             is_premium BOOLEAN NOT NULL DEFAULT FALSE,
             created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
         );
-        """
-        
-        # Create chat_history table
-        logger.info("Creating chat_history table...")
-        chat_history_table_sql = """
+
         CREATE TABLE IF NOT EXISTS chat_history (
             id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
             user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
@@ -59,13 +92,10 @@ async def create_tables():
             data JSONB,
             timestamp TIMESTAMPTZ NOT NULL DEFAULT NOW()
         );
-        CREATE INDEX IF NOT EXISTS chat_history_user_id_idx ON chat_history(user_id);
-        CREATE INDEX IF NOT EXISTS chat_history_timestamp_idx ON chat_history(timestamp);
         """
         
         # Execute SQL
-        await supabase_client.postgrest.schema("public").execute(users_table_sql)
-        await supabase_client.postgrest.schema("public").execute(chat_history_table_sql)
+        await pool.execute(tables_sql)
         
         logger.info("Tables created successfully")
         return True
@@ -74,64 +104,108 @@ async def create_tables():
         logger.error(f"Error creating tables: {str(e)}")
         return False
 
-async def create_test_user():
-    """Create a test user in the database."""
+async def create_indexes(pool: asyncpg.Pool):
+    """Create the chat_history indexes in Supabase."""
     try:
-        # Check if test user already exists
-        response = supabase_client.table("users").select("*").eq("username", "testuser").execute()
+        # History is read per user, newest first, so one composite index
+        # serves it as a range scan. CONCURRENTLY avoids blocking writes on a
+        # populated table but cannot run inside the multi-statement script.
+        logger.info("Creating chat_history index...")
+
+        # A concurrent build that failed or timed out leaves an INVALID index
+        # behind, which IF NOT EXISTS would skip forever; drop it and rebuild
+        invalid_index = await pool.fetchval(
+            """
+            SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = 'chat_history_user_id_timestamp_idx' AND NOT i.indisvalid
+            """
+        )
+        if invalid_index:
+            logger.warning("Dropping invalid chat_history index left by an earlier run")
+            await pool.execute("DROP INDEX CONCURRENTLY IF EXISTS chat_history_user_id_timestamp_idx")
+
+        await pool.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS chat_history_user_id_timestamp_idx "
+            "ON chat_history(user_id, timestamp DESC)",
+            timeout=INDEX_BUILD_TIMEOUT
+        )
         
-        if response.data:
-            logger.info("Test user already exists")
-            return True
+        # Drop the single-column indexes created by earlier versions, also
+        # without blocking writes (one index per statement)
+        for index_name in ("chat_history_user_id_idx", "chat_history_timestamp_idx"):
+            await pool.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
         
-        # Create test user
-        logger.info("Creating test user...")
-        test_user = {
-            "id": "00000000-0000-0000-0000-000000000001",
-            "username": "testuser",
-            "email": "test@example.com",
-            "full_name": "Test User",
-            "hashed_password": pwd_context.hash("password123"),
-            "is_active": True,
-            "is_premium": False,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
+        logger.info("Indexes created successfully")
+        return True
+    
+    except Exception as e:
+        logger.error(f"Error creating indexes: {str(e)}")
+        return False
+
+async def create_seed_users(pool: asyncpg.Pool):
+    """Create the seed users (currently just the test user) in the database."""
+    try:
+        # Insert all seed users in one statement, skipping those that exist
+        logger.info("Creating seed users...")
+        columns = list(zip(*SEED_USERS))
         
-        response = supabase_client.table("users").insert(test_user).execute()
+        status = await pool.execute(
+            """
+            INSERT INTO users (id, username, email, full_name, hashed_password, is_active, is_premium)
+            SELECT * FROM unnest(
+                $1::uuid[], $2::text[], $3::text[], $4::text[], $5::text[], $6::boolean[], $7::boolean[]
+            )
+            ON CONFLICT (username) DO NOTHING
+            """,
+            *columns
+        )
         
-        if response.data:
-            logger.info("Test user created successfully")
-            return True
-        else:
-            logger.error("Failed to create test user")
-            return False
+        created = int(status.rsplit(" ", 1)[-1])
+        logger.info(f"Created {created} seed users, {len(SEED_USERS) - created} already existed")
+        return True
     
     except Exception as e:
-        logger.error(f"Error creating test user: {str(e)}")
+        logger.error(f"Error creating seed users: {str(e)}")
         return False
 
 async def main():
     """Main function to set up the database."""
     logger.info("Starting database setup...")
+
+    if not settings.SUPABASE_DB_URL:
+        logger.error("SUPABASE_DB_URL is not set")
+        return False
     
     # Check Supabase connection
     try:
-        # Simple query to check connection
-        response = supabase_client.table("users").select("count(*)", count="exact").execute()
-        logger.info("Connected to Supabase successfully")
+        pool = await create_pool()
     except Exception as e:
         logger.error(f"Failed to connect to Supabase: {str(e)}")
         return False
     
-    # Create tables
-    tables_created = await create_tables()
-    if not tables_created:
-        return False
-    
-    # Create test user
-    user_created = await create_test_user()
-    if not user_created:
+    try:
+        # Simple query to check connection
+        await pool.fetchval("SELECT 1")
+        logger.info("Connected to Supabase successfully")
+        
+        # Create tables
+        tables_created = await create_tables(pool)
+        if not tables_created:
+            return False
+        
+        # Indexes and seed users only need the tables, so build them
+        # concurrently on separate pool connections
+        indexes_created, users_created = await asyncio.gather(
+            create_indexes(pool),
+            create_seed_users(pool)
+        )
+        if not (indexes_created and users_created):
+            return False
+    except Exception as e:
+        logger.error(f"Failed to connect to Supabase: {str(e)}")
         return False
+    finally:
+        await pool.close()
     
     logger.info("Database setup completed successfully")
     return True
@@ -0,0 +1,46 @@
+"""
+Shared fixtures for the test suite.
+"""
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from datetime import datetime, timedelta, timezone
+
+from app.routes import chat
+from app.models.user import User, create_access_token
+
+@pytest.fixture(scope="session")
+def chat_app():
+    """Fixture for an app serving only the chat routes, without app.main's startup work."""
+    app = FastAPI()
+    app.include_router(chat.router)
+    return app
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def client(chat_app):
+    """Fixture for an async test client shared by the whole session."""
+    transport = httpx.ASGITransport(app=chat_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as test_client:
+        yield test_client
+
+@pytest.fixture(scope="session")
+def mock_user():
+    """Fixture for the user the tests authenticate as."""
+    return User(
+        id="test1",
+        username="testuser",
+        email="test@example.com",
+        full_name="Test User",
+        is_active=True,
+        created_at=datetime.now(timezone.utc)
+    )
+
+@pytest.fixture(scope="session")
+def test_token(mock_user):
+    """Fixture for an access token for the mock user."""
+    return create_access_token(
+        data={"sub": mock_user.username},
+        expires_delta=timedelta(minutes=30)
+    )
@@ -0,0 +1,132 @@
+"""
+Tests for access token decoding and caching.
+"""
+
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+
+import jwt
+import pytest
+from fastapi import HTTPException
+from jwt import InvalidTokenError
+
+from app.config import get_settings
+from app.models import user as user_module
+from app.models.user import (
+    TOKEN_CACHE_SIZE,
+    _decode_token_username,
+    create_access_token,
+    get_current_user,
+)
+
+@pytest.fixture(autouse=True)
+def token_cache():
+    """Fixture for an empty token cache."""
+    user_module._token_cache.clear()
+    yield user_module._token_cache
+    user_module._token_cache.clear()
+
+def make_token(username: str = "testuser", minutes: int = 30) -> str:
+    """Create a token for a username expiring in the given number of minutes."""
+    return create_access_token(data={"sub": username}, expires_delta=timedelta(minutes=minutes))
+
+class TestTokenCache:
+    """Tests for the decoded token cache."""
+
+    def test_decode_caches_username(self, token_cache):
+        """Test that a decoded token is cached and reused."""
+        token = make_token()
+
+        assert _decode_token_username(token) == "testuser"
+        with patch.object(jwt, "decode") as decode:
+            assert _decode_token_username(token) == "testuser"
+
+        decode.assert_not_called()
+        assert len(token_cache) == 1
+
+    def test_expired_cache_entry_is_not_used(self, token_cache):
+        """Test that a cached token is decoded again, and so checked, once it expires."""
+        token = make_token()
+        _decode_token_username(token)
+
+        later = datetime.now(timezone.utc).timestamp() + 3600
+        with patch.object(user_module.time, "time", return_value=later), \
+                patch.object(jwt, "decode", side_effect=jwt.ExpiredSignatureError) as decode:
+            with pytest.raises(InvalidTokenError):
+                _decode_token_username(token)
+
+        decode.assert_called_once()
+        assert len(token_cache) == 0
+
+    def test_expired_token_is_not_cached(self, token_cache):
+        """Test that an expired token is rejected without being cached."""
+        with pytest.raises(InvalidTokenError):
+            _decode_token_username(make_token(minutes=-1))
+
+        assert len(token_cache) == 0
+
+    def test_tampered_token_is_rejected(self, token_cache):
+        """Test that a token with a modified signature is rejected."""
+        token = make_token()
+        _decode_token_username(token)
+        header, payload, signature = token.split(".")
+        tampered = ".".join([header, payload, signature[:-2] + ("AA" if signature[-2:] != "AA" else "BB")])
+
+        with pytest.raises(InvalidTokenError):
+            _decode_token_username(tampered)
+
+    def test_token_signed_with_other_key_is_rejected(self):
+        """Test that a token signed with another key is rejected."""
+        settings = get_settings()
+        expire = datetime.now(timezone.utc) + timedelta(minutes=30)
+        forged = jwt.encode({"sub": "testuser", "exp": expire}, settings.SECRET_KEY + "x", algorithm=settings.ALGORITHM)
+
+        with pytest.raises(InvalidTokenError):
+            _decode_token_username(forged)
+
+    def test_cache_evicts_least_recently_used(self, token_cache):
+        """Test that the cache holds at most TOKEN_CACHE_SIZE tokens."""
+        first = make_token("user0")
+        _decode_token_username(first)
+        second = make_token("user1")
+        _decode_token_username(second)
+
+        # Touch the first token so the second becomes the oldest entry
+        _decode_token_username(first)
+        for i in range(2, TOKEN_CACHE_SIZE + 1):
+            _decode_token_username(make_token(f"user{i}"))
+
+        assert len(token_cache) == TOKEN_CACHE_SIZE
+        with patch.object(jwt, "decode", wraps=jwt.decode) as decode:
+            _decode_token_username(first)
+            decode.assert_not_called()
+            _decode_token_username(second)
+            decode.assert_called_once()
+
+class TestGetCurrentUser:
+    """Tests for the get_current_user dependency."""
+
+    @pytest.mark.asyncio
+    async def test_valid_token_returns_user(self, mock_user):
+        """Test that a valid token resolves to its user."""
+        with patch.object(user_module, "get_user", AsyncMock(return_value=mock_user)) as get_user:
+            assert await get_current_user(make_token()) == mock_user
+
+        get_user.assert_awaited_once_with("testuser")
+
+    @pytest.mark.asyncio
+    async def test_invalid_token_is_unauthorized(self):
+        """Test that an invalid token is rejected with a 401."""
+        with pytest.raises(HTTPException) as excinfo:
+            await get_current_user("not-a-token")
+
+        assert excinfo.value.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_unknown_user_is_unauthorized(self):
+        """Test that a token for a missing user is rejected with a 401."""
+        with patch.object(user_module, "get_user", AsyncMock(return_value=None)):
+            with pytest.raises(HTTPException) as excinfo:
+                await get_current_user(make_token("nobody"))
+
+        assert excinfo.value.status_code == 401
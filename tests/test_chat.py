@@ -3,113 +3,124 @@ Tests for the chat API endpoints.
 """
 
 import pytest
-from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
-
-from app.main import app
-from app.routes.chat import router as chat_router
-from app.models.user import User, create_access_token
-from datetime import datetime, timedelta
-
-# Test client
-client = TestClient(app)
-
-# Mock user for testing
-mock_user = User(
-    id="test1",
-    username="testuser",
-    email="test@example.com",
-    full_name="Test User",
-    is_active=True,
-    created_at=datetime.utcnow()
-)
-
-# Create a test token
-test_token = create_access_token(
-    data={"sub": mock_user.username},
-    expires_delta=timedelta(minutes=30)
-)
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from postgrest.exceptions import APIError
+
+from app.routes.chat import get_intent_classifier, get_financial_service
+from app.models.user import get_current_user
+from app.db.models import ChatHistoryRepository
+
+# All tests share the session-scoped client's event loop
+pytestmark = pytest.mark.asyncio(loop_scope="session")
 
 @pytest.fixture
-def auth_headers():
+def auth_headers(test_token):
     """Fixture for authentication headers."""
     return {"Authorization": f"Bearer {test_token}"}
 
 # Mock the get_current_user dependency
 @pytest.fixture(autouse=True)
-def mock_get_current_user():
-    """Mock the get_current_user dependency."""
-    with patch("app.routes.chat.get_current_user", return_value=mock_user):
-        yield
+def mock_get_current_user(chat_app, mock_user):
+    """Override the get_current_user dependency with an async mock."""
+    async def get_mock_user():
+        return mock_user
+
+    chat_app.dependency_overrides[get_current_user] = get_mock_user
+    yield
+    chat_app.dependency_overrides.pop(get_current_user, None)
+
+# Mock the intent classifier and financial service
+@pytest.fixture(autouse=True)
+def mocked_services(chat_app):
+    """Override the shared services with mocks the tests configure."""
+    mock_classifier = MagicMock()
+    mock_financial_service = MagicMock()
+    mock_financial_service.get_data = AsyncMock()
+
+    async def get_mock_classifier():
+        return mock_classifier
+
+    async def get_mock_financial_service():
+        return mock_financial_service
+
+    chat_app.dependency_overrides[get_intent_classifier] = get_mock_classifier
+    chat_app.dependency_overrides[get_financial_service] = get_mock_financial_service
+    yield mock_classifier, mock_financial_service
+    chat_app.dependency_overrides.pop(get_intent_classifier, None)
+    chat_app.dependency_overrides.pop(get_financial_service, None)
 
 class TestChatAPI:
     """Tests for the chat API."""
     
-    def test_process_message_stock_price(self, auth_headers):
+    async def test_process_message_stock_price(self, client, auth_headers, mocked_services):
         """Test processing a stock price message."""
-        # Mock the intent classifier and financial service
-        with patch("app.routes.chat.intent_classifier.classify", return_value=("stock_price", 0.95)), \
-             patch("app.routes.chat.financial_service.get_data") as mock_get_data, \
-             patch("app.routes.chat.financial_service.generate_response") as mock_generate_response:
-            
-            # Set up the mocks
-            mock_data = {
-                "symbol": "AAPL",
-                "price": 150.25,
-                "change": 2.5,
-                "change_percent": 1.7
-            }
-            mock_get_data.return_value = mock_data
-            mock_generate_response.return_value = "The current price of AAPL is $150.25, which is 1.7% up today."
-            
-            # Make the request
-            response = client.post(
-                "/api/v1/chat/message",
-                json={"text": "What's the price of Apple stock?"},
-                headers=auth_headers
-            )
-            
-            # Check the response
-            assert response.status_code == 200
-            data = response.json()
-            assert data["intent"] == "stock_price"
-            assert data["confidence"] == 0.95
-            assert data["response"] == "The current price of AAPL is $150.25, which is 1.7% up today."
-            assert data["data"] == mock_data
-            
-            # Verify the mocks were called correctly
-            mock_get_data.assert_called_once()
-            mock_generate_response.assert_called_once()
+        mock_classifier, mock_financial_service = mocked_services
+
+        # Set up the mocks
+        mock_data = {
+            "symbol": "AAPL",
+            "price": 150.25,
+            "change": 2.5,
+            "change_percent": 1.7
+        }
+        mock_classifier.classify.return_value = ("stock_price", 0.95)
+        mock_financial_service.get_data.return_value = mock_data
+        mock_financial_service.generate_response.return_value = "The current price of AAPL is $150.25, which is 1.7% up today."
+        
+        # Make the request
+        response = await client.post(
+            "/api/v1/chat/message",
+            json={"text": "What's the price of Apple stock?"},
+            headers=auth_headers
+        )
+        
+        # Check the response
+        assert response.status_code == 200
+        data = response.json()
+        assert data["intent"] == "stock_price"
+        assert data["confidence"] == 0.95
+        assert data["response"] == "The current price of AAPL is $150.25, which is 1.7% up today."
+        assert data["data"] == mock_data
+        
+        # Verify the mocks were called correctly
+        mock_financial_service.get_data.assert_called_once()
+        mock_financial_service.generate_response.assert_called_once()
     
-    def test_process_message_greeting(self, auth_headers):
+    async def test_process_message_greeting(self, client, auth_headers, mocked_services):
         """Test processing a greeting message."""
-        # Mock the intent classifier and financial service
-        with patch("app.routes.chat.intent_classifier.classify", return_value=("greeting", 0.98)), \
-             patch("app.routes.chat.financial_service.generate_response") as mock_generate_response:
-            
-            # Set up the mocks
-            mock_generate_response.return_value = "Hello! I'm your financial assistant. How can I help you today?"
-            
-            # Make the request
-            response = client.post(
-                "/api/v1/chat/message",
-                json={"text": "Hello"},
-                headers=auth_headers
-            )
-            
-            # Check the response
-            assert response.status_code == 200
-            data = response.json()
-            assert data["intent"] == "greeting"
-            assert data["confidence"] == 0.98
-            assert data["response"] == "Hello! I'm your financial assistant. How can I help you today?"
-            
-            # Verify the mocks were called correctly
-            mock_generate_response.assert_called_once()
+        mock_classifier, mock_financial_service = mocked_services
+
+        # Set up the mocks
+        mock_classifier.classify.return_value = ("greeting", 0.98)
+        mock_financial_service.generate_response.return_value = "Hello! I'm your financial assistant. How can I help you today?"
+        
+        # Make the request
+        response = await client.post(
+            "/api/v1/chat/message",
+            json={"text": "Hello"},
+            headers=auth_headers
+        )
+        
+        # Check the response
+        assert response.status_code == 200
+        data = response.json()
+        assert data["intent"] == "greeting"
+        assert data["confidence"] == 0.98
+        assert data["response"] == "Hello! I'm your financial assistant. How can I help you today?"
+        
+        # Verify the mocks were called correctly
+        mock_financial_service.get_data.assert_not_called()
+        mock_financial_service.generate_response.assert_called_once()
     
-    def test_get_chat_history(self, auth_headers):
+    async def test_get_chat_history(self, client, auth_headers):
         """Test getting chat history."""
-        response = client.get("/api/v1/chat/history", headers=auth_headers)
+        mock_history = [
+            {"role": "user", "message": "Hello", "intent": "greeting"},
+            {"role": "bot", "message": "Hello! How can I help you today?", "intent": "greeting"}
+        ]
+        with patch.object(ChatHistoryRepository, "get_user_chat_history", AsyncMock(return_value=mock_history)):
+            response = await client.get("/api/v1/chat/history", headers=auth_headers)
         
         # Check the response
         assert response.status_code == 200
@@ -118,3 +129,18 @@ class TestChatAPI:
         assert len(data) > 0
         assert "role" in data[0]
         assert "message" in data[0]
+
+    async def test_get_chat_history_hides_error_details(self, client, auth_headers):
+        """Test that unexpected errors return a generic 500."""
+        with patch.object(ChatHistoryRepository, "get_user_chat_history", AsyncMock(side_effect=RuntimeError("secret"))):
+            response = await client.get("/api/v1/chat/history", headers=auth_headers)
+
+        assert response.status_code == 500
+        assert response.json() == {"detail": "Error retrieving chat history"}
+
+    async def test_get_chat_history_propagates_database_errors(self, client, auth_headers):
+        """Test that database errors reach the app's APIError handler."""
+        error = APIError({"message": "duplicate key", "code": "23505"})
+        with patch.object(ChatHistoryRepository, "get_user_chat_history", AsyncMock(side_effect=error)):
+            with pytest.raises(APIError):
+                await client.get("/api/v1/chat/history", headers=auth_headers)
@@ -0,0 +1,94 @@
+"""
+Tests for the intent classifier.
+"""
+
+import numpy as np
+import pytest
+
+from app.nlp.intent import IntentClassifier, KEYWORD_CONFIDENCE, DEFAULT_TRAINING_DATA, FAST_INTENTS
+from app.nlp.message import TokenizedMessage
+
+@pytest.fixture
+def classifier(tmp_path):
+    """Fixture for a classifier trained on the default examples."""
+    return IntentClassifier(model_path=str(tmp_path / "intent_classifier"))
+
+class TestIntentClassifier:
+    """Tests for the intent classifier."""
+
+    def test_classify_greeting(self, classifier):
+        """Test classifying a greeting."""
+        intent, confidence = classifier.classify(TokenizedMessage.from_text("Hello"))
+
+        assert intent == "greeting"
+        assert 0.0 < confidence <= 1.0
+
+    def test_classify_reuses_normalized_results(self, classifier):
+        """Test that equivalent messages are classified once."""
+        first = classifier.classify(TokenizedMessage.from_text("What's the price of Apple stock?"))
+        second = classifier.classify(TokenizedMessage.from_text("  what's the price of apple stock?  "))
+
+        assert first == second
+        assert len(classifier._cache) == 1
+
+    def test_classify_trivial_messages(self, classifier):
+        """Test that empty and one-word greeting messages skip the model."""
+        assert classifier.classify(TokenizedMessage.from_text("   ")) == ("unknown", 0.0)
+        assert classifier.classify(TokenizedMessage.from_text("?!")) == ("unknown", 0.0)
+        assert classifier.classify(TokenizedMessage.from_text("Bye!")) == FAST_INTENTS["bye"]
+        assert len(classifier._cache) == 0
+
+    def test_classify_keywords_report_model_confidence(self, classifier):
+        """Test that unambiguous keywords pick the intent with the model's confidence."""
+        for text, expected in [
+            ("How is the market today?", "market_info"),
+            ("Show me Tesla stock", "stock_price"),
+        ]:
+            message = TokenizedMessage.from_text(text)
+            proba = classifier._predict_proba(message.lower)
+            intent, confidence = classifier.classify(message)
+
+            assert intent == expected
+            assert confidence == pytest.approx(proba[list(classifier.classes_).index(expected)])
+            assert confidence != KEYWORD_CONFIDENCE
+
+    def test_classify_greeting_defers_to_question(self, classifier):
+        """Test that a greeting in front of a question does not hide it."""
+        intent, _ = classifier.classify(TokenizedMessage.from_text("hello, what is the price of AAPL?"))
+
+        assert intent == "stock_price"
+
+    def test_classify_common_words_use_model(self, classifier):
+        """Test that everyday words are not treated as keywords."""
+        intent, confidence = classifier.classify(TokenizedMessage.from_text("Can I see my portfolio?"))
+
+        assert confidence != KEYWORD_CONFIDENCE
+
+    def test_classify_price_alone_is_not_a_stock_quote(self, classifier):
+        """Test that asking for a non-stock price is left to the model."""
+        intent, confidence = classifier.classify(TokenizedMessage.from_text("What is the price of a bond?"))
+
+        assert intent != "stock_price"
+        assert confidence != KEYWORD_CONFIDENCE
+
+    def test_classify_mixed_keywords_uses_model(self, classifier):
+        """Test that keywords from several intents fall back to the model."""
+        intent, confidence = classifier.classify(TokenizedMessage.from_text("Should I invest in Apple?"))
+
+        assert intent == "financial_advice"
+        assert confidence != KEYWORD_CONFIDENCE
+
+    def test_classify_keywords_without_model(self, classifier):
+        """Test that keywords still classify messages when no model is loaded."""
+        classifier.model = None
+
+        assert classifier.classify(TokenizedMessage.from_text("Show me Tesla stock")) == ("stock_price", KEYWORD_CONFIDENCE)
+        assert classifier.classify(TokenizedMessage.from_text("Can I see my portfolio?")) == ("unknown", 0.0)
+
+    def test_dense_proba_matches_pipeline(self, classifier):
+        """Test that the NumPy inference path matches the sklearn pipeline."""
+        texts = [phrase.lower() for phrase, _ in DEFAULT_TRAINING_DATA] + ["tell me a joke", ""]
+
+        for text in texts:
+            expected = classifier.model.predict_proba([text])[0]
+            np.testing.assert_allclose(classifier._predict_proba(text), expected, rtol=1e-6)
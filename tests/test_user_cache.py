@@ -0,0 +1,69 @@
+"""
+Tests for the cached user lookups in UserRepository.
+"""
+
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.db import models
+from app.db.database import MockSupabaseClient
+from app.db.models import UserRepository
+
+pytestmark = pytest.mark.asyncio
+
+@pytest.fixture
+def supabase():
+    """Fixture for a fresh mock database whose table lookups are counted."""
+    client = MagicMock(wraps=MockSupabaseClient())
+    models._user_cache.clear()
+    with patch.object(models, "get_supabase_client", return_value=client):
+        yield client
+    models._user_cache.clear()
+
+class TestUserCache:
+    """Tests for the username lookup cache."""
+
+    async def test_cache_hit_skips_query(self, supabase):
+        """Test that a second lookup is answered from the cache."""
+        first = await UserRepository.get_user_by_username("testuser")
+        second = await UserRepository.get_user_by_username("testuser")
+
+        assert first == second
+        assert supabase.table.call_count == 1
+
+    async def test_concurrent_misses_share_one_query(self, supabase):
+        """Test that concurrent lookups of the same username query once."""
+        users = await asyncio.gather(*(UserRepository.get_user_by_username("testuser") for _ in range(5)))
+
+        assert all(user == users[0] for user in users)
+        assert supabase.table.call_count == 1
+        assert models._user_locks == {}
+
+    async def test_update_user_invalidates(self, supabase):
+        """Test that updating a user drops its cached lookup."""
+        user = await UserRepository.get_user_by_username("testuser")
+        await UserRepository.update_user(user["id"], {"full_name": "Renamed"})
+        await UserRepository.get_user_by_username("testuser")
+
+        assert "testuser" in models._user_cache
+        # Lookup, update, and a fresh lookup
+        assert supabase.table.call_count == 3
+
+    async def test_callers_cannot_mutate_cached_row(self, supabase):
+        """Test that changing a returned user leaves the cache untouched."""
+        user = await UserRepository.get_user_by_username("testuser")
+        user["email"] = "changed@example.com"
+
+        cached = await UserRepository.get_user_by_username("testuser")
+
+        assert cached["email"] == "test@example.com"
+        assert supabase.table.call_count == 1
+
+    async def test_missing_user_is_not_cached(self, supabase):
+        """Test that unknown usernames are looked up every time."""
+        assert await UserRepository.get_user_by_username("nobody") is None
+        assert await UserRepository.get_user_by_username("nobody") is None
+
+        assert supabase.table.call_count == 2